@@ -1,7 +1,8 @@
 import asyncio
 import datetime
-import numpy as np
+import logging
 import os
+import random
 import time
 
 from pymongo import MongoClient
@@ -9,6 +10,13 @@ from typing import Coroutine, Any
 from viam.robot.client import RobotClient, DialOptions
 from viam.components.board import Board
 
+logger = logging.getLogger("canary")
+
+BOARD_API_SAMPLES = 20
+
+async def backoff(attempt: int, base: float = 0.5, jitter: float = 0.5, cap: float = 30) -> None:
+    await asyncio.sleep(min(cap, base * (2 ** attempt) * (1 + random.random() * jitter)))
+
 async def connect(robot_address: str, api_key: str, api_key_id: str) -> Coroutine[Any, Any, RobotClient]:
     opts = RobotClient.Options(
         refresh_interval=0,     	 
@@ -19,82 +27,102 @@ async def connect(robot_address: str, api_key: str, api_key_id: str) -> Coroutin
     )
     return await RobotClient.at_address(robot_address, opts)
 
-async def main():
-    mongo_connection_str = os.environ["MONGODB_TEST_OUTPUT_URI"]
-    db_client = MongoClient(mongo_connection_str)
-    db = db_client["micrordk_canary"]
-    coll = db["raw_results"]
-
-    timestamp = datetime.datetime.now()
-
-    default_item = {
-        "_id": timestamp,
-        "connection_success": False,
-        "connection_error": "",
-        "connection_latency_ms": 0,
-        "board_api_successes": 0,
-        "board_api_failures": 0,
-        "connection_attempts": 5,
-        "board_api_avg_latency_ms": 0,
-        "board_api_latency_ms_std_dev": 0
-    }
-
-    robot_address = os.environ["ESP32_CANARY_ROBOT"]
-    api_key = os.environ["ESP32_CANARY_API_KEY"]
-    api_key_id = os.environ["ESP32_CANARY_API_KEY_ID"]
-
-    print(f"connecting to robot at {robot_address} ...")
+async def run_canary(item: dict, robot_address: str, api_key: str, api_key_id: str) -> None:
+    logger.info(f"connecting to robot at {robot_address} ...")
 
     start = None
     for i in range(5):
         try:
-            start = time.time()
+            start = time.perf_counter()
             robot = await connect(robot_address, api_key, api_key_id)
             connection_attempts = i + 1
             break
         except Exception as e:
             if i == 4:
-                default_item["connection_error"] = str(e)
-                coll.insert_one(default_item)
+                item["connection_error"] = str(e)
+                item["connection_attempts"] = i + 1
                 raise e
-            print(e)
-        time.sleep(0.5)
+            logger.warning(e)
+            await backoff(i)
 
-    connectivity_time = (time.time() - start) * 1000
-    default_item["connection_success"] = True
-    default_item["connection_latency_ms"] = connectivity_time
-    default_item["connection_attempts"] = connection_attempts
+    connectivity_time = (time.perf_counter() - start) * 1000
+    item["connection_success"] = True
+    item["connection_latency_ms"] = connectivity_time
+    item["connection_attempts"] = connection_attempts
 
     board_api_successes = 0
     board_api_failures = 0
-
-    board = Board.from_robot(robot, "board")
-    board_return_value = await board.gpio_pin_by_name("32")
     latencies_ms = []
-    for _ in range(20):
+    try:
         try:
-            _ = await board_return_value.get()
-            start = time.time()
-            await board_return_value.set(True)
-            latencies_ms.append((time.time() - start) * 1000)
-            value = await board_return_value.get()
-            if not value:
-                raise ValueError("Pin not set to high successfully")
-            board_api_successes += 1
+            board = Board.from_robot(robot, "board")
+            board_return_value = await board.gpio_pin_by_name("32")
         except Exception as e:
-            board_api_failures += 1
-            default_item["connection_error"] = str(e)
-        time.sleep(0.2)
+            item["connection_error"] = str(e)
+            item["board_api_failures"] = BOARD_API_SAMPLES
+            raise e
+        for _ in range(BOARD_API_SAMPLES):
+            try:
+                _ = await board_return_value.get()
+                start = time.perf_counter()
+                await board_return_value.set(True)
+                latencies_ms.append((time.perf_counter() - start) * 1000)
+                value = await board_return_value.get()
+                if not value:
+                    raise ValueError("Pin not set to high successfully")
+                board_api_successes += 1
+            except Exception as e:
+                board_api_failures += 1
+                item["connection_error"] = str(e)
+            await asyncio.sleep(0.2)
+
+        if latencies_ms:
+            import numpy as np
+            latencies = np.asarray(latencies_ms, dtype=np.float64)
+            item["board_api_avg_latency_ms"] = round(float(latencies.mean()), 3)
+            item["board_api_latency_ms_std_dev"] = round(float(latencies.std()), 3)
+            item["board_api_p95_latency_ms"] = round(float(np.percentile(latencies, 95)), 3)
 
-    default_item["board_api_avg_latency_ms"] = round(sum(latencies_ms) / len(latencies_ms), 3)
-    default_item["board_api_latency_ms_std_dev"] = round(np.std(np.array(latencies_ms)), 3)
+        item["board_api_successes"] = board_api_successes
+        item["board_api_failures"] = board_api_failures
+    finally:
+        await robot.close()
+
+async def main():
+    mongo_connection_str = os.environ["MONGODB_TEST_OUTPUT_URI"]
+    robot_address = os.environ["ESP32_CANARY_ROBOT"]
+    api_key = os.environ["ESP32_CANARY_API_KEY"]
+    api_key_id = os.environ["ESP32_CANARY_API_KEY_ID"]
+
+    timestamp = datetime.datetime.now()
 
-    default_item["board_api_successes"] = board_api_successes
-    default_item["board_api_failures"] = board_api_failures
-    
-    coll.insert_one(default_item)
+    default_item = {
+        "_id": timestamp,
+        "connection_success": False,
+        "connection_error": "",
+        "connection_latency_ms": 0,
+        "board_api_successes": 0,
+        "board_api_failures": 0,
+        "connection_attempts": 5,
+        "board_api_avg_latency_ms": 0,
+        "board_api_latency_ms_std_dev": 0,
+        "board_api_p95_latency_ms": 0
+    }
 
-    await robot.close()
+    try:
+        await run_canary(default_item, robot_address, api_key, api_key_id)
+    finally:
+        with MongoClient(
+            mongo_connection_str,
+            appname="micro-rdk-canary",
+            maxPoolSize=4,
+            minPoolSize=0,
+            serverSelectionTimeoutMS=5000,
+            w=1,
+            journal=False
+        ) as db_client:
+            db_client["micrordk_canary"]["raw_results"].insert_one(default_item)
 
 if __name__ == '__main__':
+    logging.basicConfig(level=os.getenv("CANARY_LOG_LEVEL", "INFO"), format="%(asctime)s %(message)s")
     asyncio.run(main())
@@ -1,91 +1,121 @@
 import datetime
+import functools
+import logging
 import os
 
 from importlib.metadata import version
-from dateutil import tz
-from pymongo import MongoClient
-import slack_sdk
-import slack_sdk.errors
+from pymongo import ASCENDING, IndexModel, MongoClient
+from pymongo.database import Database
+
+logger = logging.getLogger("canary")
 
 FAILURE_ACCEPTABILITY = 0.2
+SLACK_TIMEOUT_S = 5
+SUMMARY_INDEX_NAME = "daily_summary_covering"
+SUMMARY_INDEX = IndexModel(
+    [
+        ("_id", ASCENDING),
+        ("connection_success", ASCENDING),
+        ("connection_latency_ms", ASCENDING),
+        ("connection_attempts", ASCENDING),
+        ("board_api_successes", ASCENDING),
+        ("board_api_failures", ASCENDING),
+    ],
+    name=SUMMARY_INDEX_NAME
+)
+
+def day_bounds(day: datetime.date) -> tuple[datetime.datetime, datetime.datetime]:
+    start_of_day = datetime.datetime.combine(day, datetime.time.min, tzinfo=datetime.timezone.utc)
+    return start_of_day, start_of_day + datetime.timedelta(days=1)
+
+def summarize_day(db: Database, start_of_day: datetime.datetime, start_of_tomorrow: datetime.datetime, sdk_version: str) -> dict | None:
+    pipeline = [
+        { "$match": { "_id": { "$gte": start_of_day, "$lt": start_of_tomorrow } } },
+        { "$group": {
+            "_id": None,
+            "num_results": { "$sum": 1 },
+            "successes": { "$sum": { "$cond": ["$connection_success", 1, 0] } },
+            "robot_connection_failures": { "$sum": { "$cond": ["$connection_success", 0, 1] } },
+            "avg_connection_latency_ms": { "$avg": { "$cond": ["$connection_success", "$connection_latency_ms", None] } },
+            "avg_connection_attempts": { "$avg": { "$cond": ["$connection_success", "$connection_attempts", 0] } },
+            "board_api_successes": { "$sum": { "$cond": ["$connection_success", "$board_api_successes", 0] } },
+            "board_api_failures": { "$sum": { "$cond": ["$connection_success", "$board_api_failures", 0] } },
+        } },
+        { "$set": {
+            "avg_connection_latency_ms": { "$ifNull": ["$avg_connection_latency_ms", 0] },
+            "connection_failure_rate": { "$round": [{ "$divide": ["$robot_connection_failures", "$num_results"] }, 3] },
+            "board_api_failure_rate": { "$let": {
+                "vars": { "total": { "$add": ["$board_api_successes", "$board_api_failures"] } },
+                "in": { "$cond": [
+                    { "$gt": ["$$total", 0] },
+                    { "$round": [{ "$divide": ["$board_api_failures", "$$total"] }, 3] },
+                    0.0
+                ] }
+            } },
+        } },
+        { "$set": { "_id": start_of_day, "sdk_version": sdk_version } },
+        { "$merge": { "into": "daily_summaries", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert" } },
+    ]
+    db["raw_results"].aggregate(pipeline, hint=SUMMARY_INDEX_NAME)
+    return db["daily_summaries"].find_one({ "_id": start_of_day })
+
+@functools.lru_cache(maxsize=1)
+def slack_client(slack_token: str):
+    import slack_sdk
+
+    return slack_sdk.WebClient(token=slack_token, timeout=SLACK_TIMEOUT_S)
+
+def post_alert(slack_token: str, channel_id: str, alerts: list[str]):
+    import slack_sdk.errors
+
+    msg = "\n".join(alerts)
+    blocks = [{ "type": "section", "text": { "type": "mrkdwn", "text": alert } } for alert in alerts]
+    try:
+        slack_client(slack_token).chat_postMessage(channel=channel_id, blocks=blocks, text=msg).validate()
+    except slack_sdk.errors.SlackApiError as e:
+        raise RuntimeError(f"failure to post to Slack, error message was '{msg}'") from e
 
 def main():
-    today = datetime.datetime.now(tz=tz.UTC).date()
-    tomorrow = today + datetime.timedelta(days=1)
-    start_of_day = datetime.datetime(today.year, today.month, today.day, tzinfo=tz.UTC)
-    start_of_tomorrow = datetime.datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=tz.UTC)
+    today = datetime.datetime.now(tz=datetime.timezone.utc).date()
+    start_of_day, start_of_tomorrow = day_bounds(today)
 
     mongo_connection_str = os.environ["MONGODB_TEST_OUTPUT_URI"]
-    db_client = MongoClient(mongo_connection_str)
-    db = db_client["micrordk_canary"]
-    coll = db["raw_results"]
-
-    print("getting raw results...")
-
-    result_set = coll.find({ "_id": { "$gte": start_of_day, "$lt": start_of_tomorrow } })
-    latency_sum = 0
-    successes = 0
-    connection_failures = 0
-    board_api_successes = 0
-    board_api_failures = 0
-    connection_attempts = 0
-    num_results = 0
-    for record in result_set:
-        num_results += 1
-        if record["connection_success"]:
-            latency_sum += record["connection_latency_ms"]
-            connection_attempts += record["connection_attempts"]
-            successes += 1
-            board_api_successes += record["board_api_successes"]
-            board_api_failures += record["board_api_failures"]
-        else:
-            connection_failures += 1
-    
-    if num_results == 0:
-        raise Exception(f"no raw canary results found for {today}, please restart the canary")
-
-    avg_connection_latency_ms = latency_sum / successes if successes != 0 else 0
-    avg_connection_attempts = connection_attempts / num_results
-    
-    total_board_calls = board_api_successes + board_api_failures
-    sdk_version = version("viam-sdk")
-    coll2 = db["daily_summaries"]
-    summary = {
-        "_id": start_of_day,
-        "successes": successes,
-        "robot_connection_failures": connection_failures,
-        "board_api_failures": board_api_failures,
-        "avg_connection_latency_ms": avg_connection_latency_ms,
-        "avg_connection_attempts": avg_connection_attempts,
-        "sdk_version": sdk_version
-    }
-    inserted_id = coll2.insert_one(summary)
-    print(f"successfully inserted stats for {inserted_id}: {summary}")
-
-    failure_rate = round(connection_failures / num_results, 3)
-
     slack_token = os.environ["CANARY_SLACKBOT_TOKEN"]
     channel_id = os.environ["MICRO_RDK_TEAM_CHANNEL_ID"]
-    client = slack_sdk.WebClient(token=slack_token)
+
+    with MongoClient(
+        mongo_connection_str,
+        appname="micro-rdk-canary",
+        maxPoolSize=4,
+        minPoolSize=0,
+        serverSelectionTimeoutMS=5000,
+        w=1,
+        journal=False
+    ) as db_client:
+        db = db_client["micrordk_canary"]
+        db["raw_results"].create_indexes([SUMMARY_INDEX])
+
+        logger.info("summarizing raw results...")
+
+        sdk_version = version("viam-sdk")
+        stats = summarize_day(db, start_of_day, start_of_tomorrow, sdk_version)
+        if stats is None:
+            raise Exception(f"no raw canary results found for {today}, please restart the canary")
+        logger.info(f"successfully stored stats for {start_of_day}: {stats}")
+
+    failure_rate = stats["connection_failure_rate"]
+    board_failure_rate = stats["board_api_failure_rate"]
+
     version_msg = f"using Viam Python SDK {sdk_version}"
+    alerts = []
     if failure_rate > FAILURE_ACCEPTABILITY:
-        msg = f"ESP32 connection failure rate for {today} ({failure_rate * 100}%) greater than {FAILURE_ACCEPTABILITY * 100}% ({version_msg})"
-        api_result = client.chat_postMessage(channel=channel_id, text=msg)
-        try:
-            api_result.validate()
-            raise Exception(msg)
-        except slack_sdk.errors.SlackApiError as e:
-            raise Exception(f"failure to post to Slack, error message was '{msg}'") from e
-    
-    board_failure_rate = round(board_api_failures / total_board_calls)
+        alerts.append(f"ESP32 connection failure rate for {today} ({failure_rate * 100}%) greater than {FAILURE_ACCEPTABILITY * 100}% ({version_msg})")
     if board_failure_rate > FAILURE_ACCEPTABILITY:
-        msg = f"ESP32 board API failure rate for {today} ({board_failure_rate * 100}%) greater than {FAILURE_ACCEPTABILITY * 100}% ({version_msg})"
-        api_result = client.chat_postMessage(channel=channel_id, text=msg)
-        try:
-            api_result.validate()
-            raise Exception(msg)
-        except slack_sdk.errors.SlackApiError as e:
-            raise Exception(f"failure to post to Slack, error message was '{msg}'") from e
+        alerts.append(f"ESP32 board API failure rate for {today} ({board_failure_rate * 100}%) greater than {FAILURE_ACCEPTABILITY * 100}% ({version_msg})")
+    if alerts:
+        post_alert(slack_token, channel_id, alerts)
+        raise Exception("\n".join(alerts))
 
 if __name__ == '__main__':
+    logging.basicConfig(level=os.getenv("CANARY_LOG_LEVEL", "INFO"), format="%(asctime)s %(message)s")
     main()